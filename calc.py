@@ -1,9 +1,61 @@
 import numpy as np
+import hashlib
 import math
+import os
+import tempfile
+import zipfile
+from functools import lru_cache
 
+@lru_cache(maxsize=None)
+def log_factorials(n: int) -> np.ndarray:
+    """0からnまでの階乗の自然対数 log(k!) の配列を返します。
+
+    Erlang C式を対数空間で計算するためのテーブルで、結果はキャッシュされます。
+
+    Args:
+        n (int): テーブルに含める最大の k。
+
+    Returns:
+        np.ndarray: 長さ n + 1 の読み取り専用配列。k 番目の要素が log(k!)。
+    """
+    table = np.array([math.lgamma(k + 1) for k in range(n + 1)])
+    table.setflags(write=False)
+    return table
+
+def calculate_pc(rho: float, c: int) -> float:
+    """M/M/c待ち行列で到着客が待たされる確率Pc (Erlang C) を計算します。
+
+    P0 の部分和 Σ_{n<c} R^n/n! をホーナー法で評価するため、階乗や累乗を使わず
+    c 回の乗除算で求まり、c が大きくても桁あふれしません。
+
+    Args:
+        rho (float): システムの利用率。
+        c (int): サービスチャネル（窓口）の数。
+
+    Returns:
+        float: 待たされる確率Pc。rhoが1以上の場合は1を返します。
+    """
+    if rho >= 1:
+        return 1.0
+    if rho == 0:
+        return 0.0
+
+    # u_m = Σ_{n<m} m! / (n! r^(m-n)) を u_{m+1} = (u_m + 1)(m + 1) / r で更新すると、
+    # u_c は部分和を R^c / c! で割ったものになる
+    r = c * rho
+    u = 0.0
+    for m in range(1, c + 1):
+        u = (u + 1) * m / r
+
+    # Pc = F / (S + F)、F = R^c / (c! (1 - ρ)) より Pc = 1 / (1 + u_c (1 - ρ))
+    return 1 / (1 + u * (1 - rho))
+
+@lru_cache(maxsize=None)
 def calculate_lq(rho: float, c: int) -> float:
     """M/M/c待ち行列の平均待ち行列長Lqを計算します。
 
+    同じ (rho, c) の組み合わせに対する結果はキャッシュされます。
+
     Args:
         rho (float): システムの利用率。
         c (int): サービスチャネル（窓口）の数。
@@ -15,12 +67,7 @@ def calculate_lq(rho: float, c: int) -> float:
         return float('inf')
 
     # Erlang C formula
-    sum_terms = 0.0
-    for n in range(c):
-        sum_terms += ((c * rho)**n) / math.factorial(n)
-
-    pc_numerator = ((c * rho)**c) / (math.factorial(c) * (1 - rho))
-    pc = pc_numerator / (sum_terms + pc_numerator)
+    pc = calculate_pc(rho, c)
 
     lq = (pc * rho) / (1 - rho)
     return lq
@@ -105,4 +152,229 @@ def calculate_mu(lambda_val: float, rho: float, c: int) -> float:
         float: サービス率mu。
     """
     mu = lambda_val / (rho * c)
-    return mu
\ No newline at end of file
+    return mu
+
+def lq_grids(L: np.ndarray, M: np.ndarray, server_counts: list[int]) -> np.ndarray:
+    """複数のサービスチャネル数について平均待ち行列長Lqのグリッドをまとめて計算します。
+
+    サービスチャネル数 c を先頭の軸としてブロードキャストし、全ての c を一度に計算します。
+    P0 の部分和 Σ_{n<c} R^n/n! は c が小さいものが大きいものの先頭部分になっているため、
+    最大の c まで累積和を一度だけ計算し、各 c ではその途中の値を読み出します。
+    桁あふれを避けるため、各項は対数空間で扱います。
+
+    Args:
+        L (np.ndarray): 到着率 (λ) の配列。
+        M (np.ndarray): サービス率 (μ) の配列。
+        server_counts (list[int]): サービスチャネル（窓口）の数のリスト。
+
+    Returns:
+        np.ndarray: 形状 (len(server_counts), *グリッドの形状) の平均待ち行列長Lqの配列。
+            server_counts の順に並び、システムが不安定な点はNaNになります。
+    """
+    c_max = max(server_counts)
+    log_fact = log_factorials(c_max)
+
+    with np.errstate(all='ignore'):
+        R = L / M
+        log_R = np.log(R)
+
+        # n や c の軸をグリッドの前に追加するための形状
+        expand = (-1,) + (1,) * np.ndim(log_R)
+
+        # log_S[k] = log Σ_{n=0}^{k} R^n / n!
+        log_terms = np.arange(c_max).reshape(expand) * log_R - log_fact[:c_max].reshape(expand)
+        # n = 0 の項は R = 0 でも 1 (0 * log 0 が NaN にならないよう明示的に設定)
+        log_terms[0] = 0.0
+        log_S = np.logaddexp.accumulate(log_terms, axis=0)
+
+        cs = np.asarray(server_counts).reshape(expand)
+        rho = R / cs
+
+        # Erlang C 確率 Pc = F / (S + F)、F = R^c / (c! (1 - ρ))
+        log_final_term = cs * log_R - log_fact[cs] - np.log1p(-rho)
+        pc = 1 / (1 + np.exp(log_S[cs.ravel() - 1] - log_final_term))
+
+        # 平均待ち行列長 Lq の計算
+        lq = pc * rho / (1 - rho)
+
+    # システムが不安定 (λ >= cμ) または μ <= 0 となる点はNaNにする
+    unstable = (L >= cs * M) | (M <= 0)
+    return np.where(unstable | ~np.isfinite(lq), np.nan, lq)
+
+def lq_grid(L: np.ndarray, M: np.ndarray, c: int) -> np.ndarray:
+    """到着率Lとサービス率Mの配列から平均待ち行列長Lqをまとめて計算します。
+
+    L と M は互いにブロードキャスト可能な形状であれば良く、
+    (1, N) と (N, 1) の1次元ベクトルを渡すと (N, N) のグリッドが得られます。
+
+    Args:
+        L (np.ndarray): 到着率 (λ) の配列。
+        M (np.ndarray): サービス率 (μ) の配列。
+        c (int): サービスチャネル（窓口）の数。
+
+    Returns:
+        np.ndarray: 平均待ち行列長Lqの配列。システムが不安定な点はNaNになります。
+    """
+    return lq_grids(L, M, [c])[0]
+
+# キャッシュファイルの形式や計算方法を変えた場合はこの値を上げ、古いキャッシュを使わないようにする
+_GRID_CACHE_VERSION = 1
+
+def _load_cached_grid(path: str, shape: tuple[int, ...]) -> np.ndarray | None:
+    """キャッシュファイルからLqのグリッドを読み込みます。
+
+    ファイルがない、壊れている (書き込み途中で中断された等)、または形状が合わない場合は
+    None を返し、呼び出し側で再計算させます。
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            lq = data['lq']
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        return None
+    if lq.shape != shape:
+        return None
+    return lq
+
+def _save_cached_grid(path: str, lq: np.ndarray) -> None:
+    """Lqのグリッドをキャッシュファイルに保存します。
+
+    同じディレクトリの一時ファイルに書き込んでから os.replace で置き換えるため、
+    中断や複数スクリプトの同時実行でも書きかけのファイルが残りません。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, lq=lq)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def lq_grids_cached(lambda_vals: np.ndarray, mu_vals: np.ndarray, server_counts: list[int],
+                    cache_dir: str = 'cache') -> np.ndarray:
+    """平均待ち行列長Lqのグリッドを計算し、結果をディスクにキャッシュします。
+
+    グリッドは到着率が列方向、サービス率が行方向になります。キャッシュは
+    c と軸ベクトルの値から作るキーごとに .npz ファイルとして保存されるため、
+    同じ軸を使う再実行や別のスクリプトでは再計算せずに読み込みます。
+
+    Args:
+        lambda_vals (np.ndarray): 到着率 (λ) の1次元配列。
+        mu_vals (np.ndarray): サービス率 (μ) の1次元配列。
+        server_counts (list[int]): サービスチャネル（窓口）の数のリスト。
+        cache_dir (str): キャッシュファイルを置くディレクトリ。
+
+    Returns:
+        np.ndarray: 形状 (len(server_counts), len(mu_vals), len(lambda_vals)) の平均待ち行列長Lqの配列。
+            server_counts の順に並び、システムが不安定な点はNaNになります。
+    """
+    lambda_vals = np.asarray(lambda_vals, dtype=np.float64)
+    mu_vals = np.asarray(mu_vals, dtype=np.float64)
+
+    paths = []
+    for c in server_counts:
+        key = hashlib.sha1()
+        key.update(f'{_GRID_CACHE_VERSION}:{c}:{lambda_vals.size}:{mu_vals.size}:'.encode())
+        key.update(lambda_vals.tobytes())
+        key.update(mu_vals.tobytes())
+        paths.append(os.path.join(cache_dir, f'lq_{key.hexdigest()}.npz'))
+
+    lq_vals = np.empty((len(server_counts), mu_vals.size, lambda_vals.size))
+    missing = []
+    for idx, path in enumerate(paths):
+        lq = _load_cached_grid(path, lq_vals.shape[1:])
+        if lq is None:
+            missing.append(idx)
+        else:
+            lq_vals[idx] = lq
+
+    # キャッシュにない c だけをまとめて計算する (P0 の部分和は c 間で共有される)
+    if missing:
+        computed = lq_grids(lambda_vals[np.newaxis, :], mu_vals[:, np.newaxis],
+                            [server_counts[idx] for idx in missing])
+        os.makedirs(cache_dir, exist_ok=True)
+        for idx, lq in zip(missing, computed):
+            _save_cached_grid(paths[idx], lq)
+            lq_vals[idx] = lq
+
+    return lq_vals
+
+def wq_grids(L: np.ndarray, M: np.ndarray, server_counts: list[int],
+             lq_vals: np.ndarray | None = None) -> np.ndarray:
+    """複数のサービスチャネル数について平均待ち時間Wqのグリッドをまとめて計算します。
+
+    Args:
+        L (np.ndarray): 到着率 (λ) の配列。
+        M (np.ndarray): サービス率 (μ) の配列。
+        server_counts (list[int]): サービスチャネル（窓口）の数のリスト。
+        lq_vals (np.ndarray | None): lq_grids と同じ形状の計算済みの平均待ち行列長Lqの配列。
+            指定した場合はその配列を上書きして Wq を求めます。省略時は lq_grids で計算します。
+
+    Returns:
+        np.ndarray: 形状 (len(server_counts), *グリッドの形状) の平均待ち時間Wqの配列。
+            server_counts の順に並び、システムが不安定な点はNaNになります。
+    """
+    if lq_vals is None:
+        lq_vals = lq_grids(L, M, server_counts)
+
+    # 平均待ち時間 Wq の計算 (リトルの法則: Wq = Lq / λ)。λ = 0 の点は Lq = 0 のまま残す
+    np.divide(lq_vals, L, out=lq_vals, where=(L != 0))
+
+    return lq_vals
+
+def wq_grid(L: np.ndarray, M: np.ndarray, c: int) -> np.ndarray:
+    """到着率Lとサービス率Mの配列から平均待ち時間Wqをまとめて計算します。
+
+    Args:
+        L (np.ndarray): 到着率 (λ) の配列。
+        M (np.ndarray): サービス率 (μ) の配列。
+        c (int): サービスチャネル（窓口）の数。
+
+    Returns:
+        np.ndarray: 平均待ち時間Wqの配列。システムが不安定な点はNaNになります。
+    """
+    return wq_grids(L, M, [c])[0]
+
+def w_grids(L: np.ndarray, M: np.ndarray, server_counts: list[int], wq_weight: float = 1.0,
+            lq_vals: np.ndarray | None = None) -> np.ndarray:
+    """複数のサービスチャネル数について平均応答時間W = wq_weight * Wq + 1/μ のグリッドを計算します。
+
+    中間の Wq グリッドを別に確保せず、同じ配列の上で W まで計算します。
+
+    Args:
+        L (np.ndarray): 到着率 (λ) の配列。
+        M (np.ndarray): サービス率 (μ) の配列。
+        server_counts (list[int]): サービスチャネル（窓口）の数のリスト。
+        wq_weight (float): 平均待ち時間Wqに掛ける係数。
+        lq_vals (np.ndarray | None): lq_grids と同じ形状の計算済みの平均待ち行列長Lqの配列。
+            指定した場合はその配列を上書きして W を求めます。省略時は lq_grids で計算します。
+
+    Returns:
+        np.ndarray: 形状 (len(server_counts), *グリッドの形状) の平均応答時間Wの配列。
+            server_counts の順に並び、システムが不安定な点はNaNになります。
+    """
+    wq_vals = wq_grids(L, M, server_counts, lq_vals)
+
+    with np.errstate(divide='ignore'):
+        service_time = 1 / M
+
+    wq_vals *= wq_weight
+    wq_vals += service_time
+
+    return wq_vals
+
+def w_grid(L: np.ndarray, M: np.ndarray, c: int, wq_weight: float = 1.0) -> np.ndarray:
+    """到着率Lとサービス率Mの配列から平均応答時間W = wq_weight * Wq + 1/μ をまとめて計算します。
+
+    Args:
+        L (np.ndarray): 到着率 (λ) の配列。
+        M (np.ndarray): サービス率 (μ) の配列。
+        c (int): サービスチャネル（窓口）の数。
+        wq_weight (float): 平均待ち時間Wqに掛ける係数。
+
+    Returns:
+        np.ndarray: 平均応答時間Wの配列。システムが不安定な点はNaNになります。
+    """
+    return w_grids(L, M, [c], wq_weight)[0]
@@ -1,7 +1,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import math
-from calc import calculate_lq, calculate_wq, calculate_rho, calculate_lambda, calculate_mu
+from calc import calculate_lq, calculate_wq, calculate_lambda, calculate_mu, calculate_pc, lq_grids_cached, w_grids
 
 """M/M/c待ち行列モデルの応答時間に関する等高線プロットを生成するスクリプト。
 
@@ -22,28 +21,24 @@ def calculate_average_queue_time(arrival_rate: float, service_rate: float, serve
     Returns:
         float | None: 平均待ち時間Wq。システムが不安定な場合や計算エラーの場合はNaNを返します。
     """
-    if arrival_rate >= servers * service_rate or service_rate <= 0:
+    if service_rate <= 0:
         return np.nan
 
-    rho = calculate_rho(arrival_rate, service_rate, servers)
-    
-    if rho >= 1.0:
-        return np.nan
+    rho = arrival_rate / (servers * service_rate)
 
-    try:
-        # P0 (システムが空である確率) の計算
-        r = arrival_rate / service_rate
-        sum_term = sum((r**n) / math.factorial(n) for n in range(servers))
-        final_term = (r**servers / math.factorial(servers)) * (1 / (1 - rho))
-        p0 = 1 / (sum_term + final_term)
-    except (ValueError, OverflowError):
+    # システムが不安定な場合 (λ >= cμ)
+    if not (rho < 1.0):
         return np.nan
 
-    # 平均待ち行列長 Lq の計算
-    lq = ((r**servers * rho) / (math.factorial(servers) * (1 - rho)**2)) * p0
-
     if arrival_rate == 0:
         return 0.0
+
+    # Erlang C 確率 Pc (到着客が待たされる確率) の計算
+    pc = calculate_pc(rho, servers)
+
+    # 平均待ち行列長 Lq の計算
+    lq = pc * rho / (1 - rho)
+
     # 平均待ち時間 Wq の計算 (リトルの法則: Wq = Lq / λ)
     wq = lq / arrival_rate
 
@@ -56,8 +51,9 @@ resolution = 200
 lambda_vals = np.linspace(1, 300, resolution)
 # サービス率 (μ) の範囲
 mu_vals = np.linspace(10, 60, resolution)
-# メッシュグリッドの作成
-L, M = np.meshgrid(lambda_vals, mu_vals)
+# グリッドの軸ベクトル (λ は列方向, μ は行方向)。計算時にブロードキャストされる
+L = lambda_vals[np.newaxis, :]
+M = mu_vals[:, np.newaxis]
 
 # 考慮するサーバー（ポッド）の数
 server_counts = [6, 8, 10]
@@ -72,32 +68,21 @@ fig, ax = plt.subplots(figsize=(12, 8))
 # 各サーバー数に対応するプロットの色
 colors = ['#1f77b4', '#ff7f0e', '#2ca02c'] # 青、オレンジ、緑
 
+# --- 応答時間の計算 ---
+# 全てのサーバー数 (c) について応答時間 W = 3*Wq + 1/μ をまとめて計算 (P0 の部分和を c 間で共有)
+# ここでは3*Wqとしているが、これは特定の要件に基づくもの。
+# Lq のグリッドは ./cache にキャッシュされ、再実行時には読み込むだけになる
+print(f"Calculating for c = {', '.join(map(str, server_counts))}...")
+Lq_grids = lq_grids_cached(lambda_vals, mu_vals, server_counts)
+W_grids = w_grids(L, M, server_counts, wq_weight=3, lq_vals=Lq_grids)
+
 # --- コンタープロット生成ループ ---
 # 各サーバー数 (c) ごとに処理を繰り返す
-for i, c in enumerate(server_counts):
-    print(f"Calculating for c = {c}...")
-    # 応答時間 W = 3*Wq + 1/μ を格納する配列を初期化
-    W_vals = np.zeros_like(M)
-    # メッシュグリッドの各点に対して応答時間を計算
-    for row_idx in range(M.shape[0]):
-        for col_idx in range(M.shape[1]):
-            mu_val = M[row_idx, col_idx]
-            lambda_val = L[row_idx, col_idx]
-            
-            # 平均待ち時間 Wq を計算
-            wq = calculate_average_queue_time(lambda_val, mu_val, c)
-            
-            if wq is not np.nan:
-                # 平均応答時間 W を計算 (W = Wq + 1/μ)。ここでは3*Wqとしているが、これは特定の要件に基づくもの。
-                W_vals[row_idx, col_idx] = 3*wq + (1 / mu_val)
-            else:
-                # 計算不能な場合はNaNを設定
-                W_vals[row_idx, col_idx] = np.nan
-
-
+for i, (c, W_vals) in enumerate(zip(server_counts, W_grids)):
     # 目標応答時間 (target_w_s) の等高線をプロット
+    # matplotlib には2次元配列が必要なため、コピーせずにブロードキャストしたビューを渡す
     contour = ax.contour(
-        M, L, W_vals,
+        np.broadcast_to(M, W_vals.shape), np.broadcast_to(L, W_vals.shape), W_vals,
         levels=[target_w_s],
         colors=[colors[i]],
         linewidths=2.5
@@ -2,7 +2,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 import math
-from calc import calculate_lq, calculate_wq, calculate_rho
+from calc import calculate_lq, calculate_wq, lq_grids_cached
 
 """M/M/c待ち行列モデルの平均待ち時間（Wq）を3Dプロットで可視化するスクリプト。
 
@@ -22,20 +22,17 @@ def calculate_wq_for_plot(arrival_rate: float, service_rate: float, servers: int
     Returns:
         float | None: 平均待ち時間Wq。システムが不安定な場合や計算エラーの場合はNaNを返します。
     """
-    if arrival_rate >= servers * service_rate or service_rate <= 0:
+    if service_rate <= 0:
         return np.nan
 
-    rho = calculate_rho(arrival_rate, service_rate, servers)
+    rho = arrival_rate / (servers * service_rate)
 
-    # システムが不安定な場合
-    if rho >= 1.0:
+    # システムが不安定な場合 (λ >= cμ)
+    if not (rho < 1.0):
         return np.nan
 
-    try:
-        lq = calculate_lq(rho, servers)
-        wq = calculate_wq(lq, service_rate)
-    except (ValueError, OverflowError):
-        return np.nan
+    lq = calculate_lq(rho, servers)
+    wq = calculate_wq(lq, service_rate)
 
     if arrival_rate == 0:
         return 0.0
@@ -50,25 +47,26 @@ resolution = 200
 lambda_vals = np.linspace(50, 250, resolution)
 # サービス率 (μ) の範囲
 mu_vals = np.linspace(10, 50, resolution)
-# メッシュグリッドの作成
-L, M = np.meshgrid(lambda_vals, mu_vals)
+# グリッドの軸ベクトル (λ は列方向, μ は行方向)。計算時にブロードキャストされる
+L = lambda_vals[np.newaxis, :]
+M = mu_vals[:, np.newaxis]
 
 # プロットするサーバ（ポッド）数のリスト
 server_counts = [6, 8, 10]
 
+# --- 平均待ち行列長の計算 ---
+
+# 全てのサーバー数 (c) について平均待ち行列長 Lq をまとめて計算 (P0 の部分和を c 間で共有)
+# 結果は ./cache にキャッシュされ、再実行時には読み込むだけになる
+print(f"Calculating for c = {', '.join(map(str, server_counts))}...")
+Lq_grids = lq_grids_cached(lambda_vals, mu_vals, server_counts)
+
 # --- プロット生成ループ ---
 
 # 各サーバー数 (c) ごとに3Dプロットを生成
-for c in server_counts:
-    print(f"Calculating for c = {c}...")
-    # 平均待ち時間 Wq を格納する配列を初期化
-    Wq_vals = np.zeros_like(L)
-    # メッシュグリッドの各点に対して平均待ち時間 Wq を計算
-    for i in range(L.shape[0]):
-        for j in range(L.shape[1]):
-            lambda_val = L[i, j]
-            mu_val = M[i, j]
-            Wq_vals[i, j] = calculate_wq_for_plot(lambda_val, mu_val, c)
+for c, Lq_vals in zip(server_counts, Lq_grids):
+    # グリッド全体の平均待ち時間 Wq (calculate_wq_for_plot と同じく Wq = Lq / μ)
+    Wq_vals = Lq_vals / M
 
     print(f"Plotting for c = {c}...")
     # 新しい図を作成
@@ -76,8 +74,12 @@ for c in server_counts:
     # 3Dプロット用のサブプロットを追加
     ax = fig.add_subplot(111, projection='3d')
 
-    # 3D曲面をプロット (Wqの値を0から1.0にクリップして表示)
-    surf = ax.plot_surface(M, L, np.clip(Wq_vals, 0, 1.0), cmap='viridis', edgecolor='none')
+    # Wqの値を0から1.0にクリップ (新しい配列を確保せずにその場で書き換える)
+    np.clip(Wq_vals, 0.0, 1.0, out=Wq_vals)
+    # 3D曲面をプロット
+    # エッジを描かないためアンチエイリアスは不要で、無効にして描画を軽くする
+    # plot_surface には2次元配列が必要なため、コピーせずにブロードキャストしたビューを渡す
+    surf = ax.plot_surface(np.broadcast_to(M, Wq_vals.shape), np.broadcast_to(L, Wq_vals.shape), Wq_vals, cmap='viridis', edgecolor='none', antialiased=False)
 
     # --- グラフの装飾 (ラベル位置を調整) ---
     # タイトル設定